@@ -1,132 +1,248 @@
 #!/usr/bin/env python3
 """
-Simple script to generate sample survival data CSV without pandas dependency.
+Simple script to generate sample survival data CSV.
+All patients are drawn in one batch with NumPy instead of a per-row Python loop.
+For large datasets the hazard/censoring kernel is JIT-compiled with numba, if installed.
+A Parquet copy of the data is written next to the CSV for faster loading.
+Large datasets are generated in fixed-size, independently seeded chunks across processes.
 """
 
-import csv
-import random
-import math
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
 
-# Set random seed for reproducibility
-random.seed(42)
+# Category labels in sorted order, so the int8 codes drawn below match the
+# codes pandas assigns when the columns are converted to categoricals
+GENDERS = np.array(['Female', 'Male'])
+TREATMENTS = np.array(['A', 'B', 'C'])
 
-def generate_sample_data(n_samples=500, output_file='../data/sample_survival_data.csv'):
-    """Generate synthetic survival data and save as CSV."""
-    
-    # Initialize data list with headers
-    data = [['patient_id', 'survival_time', 'event', 'age', 'gender', 'treatment', 'biomarker1', 'biomarker2']]
+# Hazard multiplier per treatment code (A=0, B=1, C=2):
+# - Treatment A: Moderate protective effect (HR ~0.7)
+# - Treatment B: Strong protective effect (HR ~0.4)
+# - Treatment C: Reference group (HR = 1.0)
+TREATMENT_EFFECT = np.array([0.65, 0.35, 1.0])
+
+# Baseline hazard rate (per day), shared by the NumPy and numba outcome paths
+BASELINE_HAZARD = 0.015
+
+# Only use the numba kernel for datasets of this many patients or more:
+# importing numba and loading the compiled kernel costs ~0.5 s, while the
+# kernel saves only a few ms per 100k rows over the vectorized NumPy path.
+# The decision is made once per dataset, so every chunk of a large dataset
+# uses the kernel
+NUMBA_THRESHOLD = 1_000_000
+
+def _simulate_outcomes(age, biomarker1, t_code, exp_draw, censoring_time, u_force, u_recensor):
+    """Compute observed survival times and event flags from pre-sampled random draws."""
     
-    for i in range(1, n_samples + 1):
-        # Generate patient ID
-        patient_id = i
-        
-        # Generate age (30-80 years)
-        age = random.randint(30, 80)
-        
-        # Generate gender (categorical)
-        gender = random.choice(['Male', 'Female'])
-        
-        # Generate treatment groups (A, B, C)
-        treatment = random.choice(['A', 'B', 'C'])
-        
-        # Generate biomarker levels (normal distribution approximation)
-        biomarker1 = round(random.gauss(50, 15), 2)
-        biomarker2 = round(random.gauss(100, 25), 2)
-        
-        # Generate survival times based on covariates
-        # Stronger effects for better demonstration:
-        # - Treatment B: Strong protective effect (HR ~0.4)
-        # - Treatment A: Moderate protective effect (HR ~0.7)
-        # - Treatment C: Reference group (HR = 1.0)
-        baseline_hazard = 0.015
-        if treatment == 'B':
-            treatment_effect = 0.35  # Strong protective effect - much better survival
-        elif treatment == 'A':
-            treatment_effect = 0.65  # Moderate protective effect - better survival
-        else:
-            treatment_effect = 1.0   # Control/reference group
-        
-        # Age effect: Strong positive association (older = worse survival)
-        # Each 10 years increases hazard by ~40%
-        age_effect = 1 + (age - 50) / 50 * 1.2  # Normalized around age 50
-        
-        # Biomarker1 effect: Strong negative association (higher biomarker = better survival)
-        # Higher biomarker1 values are protective
-        biomarker_effect = 1 - (biomarker1 - 50) / 100 * 0.8  # Normalized around 50
-        biomarker_effect = max(0.3, biomarker_effect)  # Prevent negative values
-        
-        # Combine all effects multiplicatively
-        hazard_rate = baseline_hazard * treatment_effect * age_effect * biomarker_effect
-        
-        # Generate survival time (exponential distribution)
-        survival_time = random.expovariate(hazard_rate) if hazard_rate > 0 else 1825
-        
-        # Cap maximum survival time at 1825 days (5 years)
-        survival_time = min(survival_time, 1825)
-        
-        # Generate censoring (target ~30% censoring rate)
-        # Generate random censoring time between 1 year and 5 years
-        censoring_time = random.uniform(365, 1825)
-        
-        # Determine if event occurs before censoring
-        # Use survival_time vs censoring_time to determine event status
-        # This preserves the treatment effect relationships
-        if survival_time <= censoring_time:
-            # Event occurs before censoring
-            event = 1
-            survival_time_observed = survival_time
-        else:
-            # Censoring occurs before event
-            event = 0
-            survival_time_observed = censoring_time
-            
-        # Force ~30% censoring rate by adjusting some observations
-        # But do this in a way that preserves treatment effect relationships
-        if random.random() < 0.1:  # 10% chance to force additional censoring
-            if event == 1 and survival_time_observed > 365:  # Only censor if survival > 1 year
-                event = 0
-                survival_time_observed = random.uniform(365, min(survival_time_observed, 1825))
-        
+    # Generate survival times based on covariates
+    # Stronger effects for better demonstration (see TREATMENT_EFFECT)
+    treatment_effect = TREATMENT_EFFECT[t_code]
+
+    # Age effect: Strong positive association (older = worse survival)
+    # Each 10 years increases hazard by ~40%
+    age_effect = 1 + (age - 50) / 50 * 1.2  # Normalized around age 50
+
+    # Biomarker1 effect: Strong negative association (higher biomarker = better survival)
+    # Higher biomarker1 values are protective
+    biomarker_effect = 1 - (biomarker1 - 50) / 100 * 0.8  # Normalized around 50
+    biomarker_effect = np.maximum(0.3, biomarker_effect)  # Prevent negative values
+
+    # Combine all effects multiplicatively
+    hazard_rate = BASELINE_HAZARD * treatment_effect * age_effect * biomarker_effect
+
+    # Generate survival time (exponential distribution)
+    # Cap maximum survival time at 1825 days (5 years)
+    survival_time = np.minimum(exp_draw / hazard_rate, 1825)
+
+    # Determine if event occurs before censoring
+    # Use survival_time vs censoring_time to determine event status
+    # This preserves the treatment effect relationships
+    observed_event = survival_time <= censoring_time
+    survival_time_observed = np.minimum(survival_time, censoring_time)
+
+    # Force ~30% censoring rate by adjusting some observations
+    # But do this in a way that preserves treatment effect relationships
+    # 10% chance to force additional censoring, only if survival > 1 year
+    # (blended with masks instead of a per-row branch)
+    force = (u_force < 0.1) & observed_event & (survival_time_observed > 365)
+    recensored_time = 365 + (np.minimum(survival_time_observed, 1825) - 365) * u_recensor
+    survival_time_observed = np.where(force, recensored_time, survival_time_observed)
+    event = (observed_event & ~force).astype(np.int8)
+
+    return survival_time_observed, event
+
+_numba_kernel = None
+
+# Threads for the kernel's prange loop in this process; None keeps numba's
+# default (all CPUs). Worker processes share the CPUs between them
+_numba_threads = None
+
+def _get_numba_kernel():
+    """Import numba and compile (or load the cached) outcome kernel on first use; None without numba."""
+    global _numba_kernel
+    if _numba_kernel is None:
+        try:
+            from numba import njit, prange, set_num_threads
+        except ImportError:
+            _numba_kernel = False
+            return None
+        if _numba_threads is not None:
+            set_num_threads(_numba_threads)
+
+        @njit(parallel=True, cache=True)
+        def _fill_outcomes(age, biomarker1, t_code, exp_draw, censoring_time, u_force, u_recensor,
+                           out_time, out_event):
+            """Numba kernel equivalent to _simulate_outcomes, writing into the output arrays."""
+            for i in prange(age.size):
+                treatment_effect = TREATMENT_EFFECT[t_code[i]]
+                age_effect = 1 + (age[i] - 50) / 50 * 1.2
+                biomarker_effect = max(0.3, 1 - (biomarker1[i] - 50) / 100 * 0.8)
+                hazard_rate = BASELINE_HAZARD * treatment_effect * age_effect * biomarker_effect
+
+                survival_time = min(exp_draw[i] / hazard_rate, 1825.0)
+                if survival_time <= censoring_time[i]:
+                    event = 1
+                    observed = survival_time
+                else:
+                    event = 0
+                    observed = censoring_time[i]
+
+                if u_force[i] < 0.1 and event == 1 and observed > 365:
+                    event = 0
+                    observed = 365 + (min(observed, 1825.0) - 365) * u_recensor[i]
+
+                out_time[i] = observed
+                out_event[i] = event
+
+        _numba_kernel = _fill_outcomes
+    return _numba_kernel or None
+
+# Patients per independently seeded chunk. The chunk count follows from the
+# dataset size alone, so the output does not depend on the number of CPUs.
+# Only datasets larger than one chunk use worker processes: starting a
+# spawned worker takes ~0.5 s, while 100k patients take ~15 ms in-process
+CHUNK_SIZE = 1_000_000
+
+def _init_worker(numba_threads):
+    """Give each worker process its share of the CPUs for the numba kernel (numba is not imported here)."""
+    global _numba_threads
+    _numba_threads = numba_threads
+
+def _generate_chunk(seed, n_samples, use_numba=False):
+    """Simulate n_samples patients from their own seeded generator; returns a dict of arrays."""
+
+    # Set random seed for reproducibility
+    rng = np.random.default_rng(seed)
+
+    # Generate age (30-80 years)
+    age = rng.integers(30, 81, n_samples)
+
+    # Generate gender (categorical), drawn as int8 codes into GENDERS
+    g_code = rng.integers(0, 2, n_samples, dtype=np.int8)
+
+    # Generate treatment groups (A, B, C), drawn as int8 codes into TREATMENTS
+    t_code = rng.integers(0, 3, n_samples, dtype=np.int8)
+
+    # Generate biomarker levels (normal distribution)
+    biomarker1 = rng.normal(50, 15, n_samples).round(2)
+    biomarker2 = rng.normal(100, 25, n_samples).round(2)
+
+    # Pre-sample the remaining random draws so the results do not depend on
+    # whether the numba kernel or the NumPy fallback computes the outcomes
+    exp_draw = rng.standard_exponential(n_samples)
+    # Generate random censoring time between 1 year and 5 years (target ~30% censoring)
+    censoring_time = rng.uniform(365, 1825, n_samples)
+    u_force = rng.random(n_samples)
+    u_recensor = rng.random(n_samples)
+
+    kernel = _get_numba_kernel() if use_numba else None
+    if kernel is not None:
+        survival_time_observed = np.empty(n_samples)
+        event = np.empty(n_samples, dtype=np.int8)
+        kernel(age, biomarker1, t_code, exp_draw, censoring_time, u_force, u_recensor,
+                       survival_time_observed, event)
+    else:
+        survival_time_observed, event = _simulate_outcomes(
+            age, biomarker1, t_code, exp_draw, censoring_time, u_force, u_recensor)
+
+    return {
         # Round survival time
-        survival_time_observed = round(survival_time_observed, 2)
-        
-        # Add row to data
-        data.append([
-            patient_id,
-            survival_time_observed,
-            event,
-            age,
-            gender,
-            treatment,
-            biomarker1,
-            biomarker2
-        ])
-    
-    # Write to CSV file
-    with open(output_file, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerows(data)
-    
+        'survival_time': survival_time_observed.round(2),
+        'event': event,
+        'age': age,
+        'g_code': g_code,
+        't_code': t_code,
+        'biomarker1': biomarker1,
+        'biomarker2': biomarker2
+    }
+
+def generate_sample_data(n_samples=500, output_file='../data/sample_survival_data.csv', random_seed=42):
+    """Generate synthetic survival data and save as CSV."""
+
+    use_numba = n_samples >= NUMBA_THRESHOLD
+    n_chunks = -(-n_samples // CHUNK_SIZE)
+    if n_chunks > 1:
+        # Fixed-size chunks, each with an independent child seed
+        seeds = np.random.SeedSequence(random_seed).spawn(n_chunks)
+        sizes = [len(part) for part in np.array_split(np.arange(n_samples), n_chunks)]
+        n_cpus = os.cpu_count() or 1
+        n_workers = min(n_chunks, n_cpus)
+        # Use spawn: forked children can deadlock in numba's parallel threading layer
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(max(1, n_cpus // n_workers),)) as executor:
+            chunks = list(executor.map(_generate_chunk, seeds, sizes, [use_numba] * n_chunks))
+        arrays = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    else:
+        arrays = _generate_chunk(random_seed, n_samples, use_numba)
+    event = arrays['event']
+
+    data = pd.DataFrame({
+        # Generate patient IDs
+        'patient_id': np.arange(1, n_samples + 1),
+        'survival_time': arrays['survival_time'],
+        'event': event,
+        'age': arrays['age'],
+        'gender': pd.Categorical.from_codes(arrays['g_code'], GENDERS),
+        'treatment': pd.Categorical.from_codes(arrays['t_code'], TREATMENTS),
+        'biomarker1': arrays['biomarker1'],
+        'biomarker2': arrays['biomarker2']
+    })
+
+    # Write to CSV file in chunks so large datasets are formatted incrementally
+    data.to_csv(output_file, index=False, chunksize=50000)
+
+    # Write a Parquet copy, gender/treatment are stored dictionary-encoded
+    parquet_file = os.path.splitext(output_file)[0] + '.parquet'
+    try:
+        data.to_parquet(parquet_file, compression='zstd')
+    except ImportError:
+        parquet_file = None
+
     print(f"Sample survival data created successfully!")
     print(f"Output file: {output_file}")
-    print(f"Shape: {n_samples} rows, 8 columns")
-    
+    if parquet_file:
+        print(f"Parquet file: {parquet_file}")
+    else:
+        print("pyarrow not installed, skipped Parquet output")
+    print(f"Shape: {n_samples} rows, {data.shape[1]} columns")
+
     # Count events
-    events = sum(row[2] for row in data[1:])
+    events = int(event.sum())
     print(f"Events: {events}/{n_samples} ({100*events/n_samples:.1f}%)")
-    
+
     # Print first few rows
     print("\nFirst 5 rows:")
-    for i, row in enumerate(data[:6]):
-        if i == 0:
-            print(" | ".join(str(x) for x in row))
-        else:
-            print(" | ".join(str(x) for x in row))
+    print(" | ".join(data.columns))
+    for row in data.head().itertuples(index=False):
+        print(" | ".join(str(x) for x in row))
 
 if __name__ == "__main__":
-    import os
     script_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(os.path.dirname(script_dir), 'data')
     output_file = os.path.join(data_dir, 'sample_survival_data.csv')
     generate_sample_data(n_samples=500, output_file=output_file)
-
@@ -7,6 +7,11 @@ This can be run independently or imported into the tutorial notebook.
 import pandas as pd
 import numpy as np
 
+TREATMENTS = np.array(['A', 'B', 'C'])
+
+# Hazard multiplier per treatment (A, B, C); Treatment B has the best survival
+TREATMENT_EFFECT = np.array([0.8, 0.5, 1.0])
+
 def generate_sample_survival_data(n_samples=500, random_seed=42):
     """
     Generate synthetic survival data for COX regression analysis.
@@ -35,7 +40,7 @@ def generate_sample_survival_data(n_samples=500, random_seed=42):
     gender = np.random.choice(['Male', 'Female'], n_samples, p=[0.55, 0.45])
     
     # Generate treatment groups (A, B, C)
-    treatment = np.random.choice(['A', 'B', 'C'], n_samples, p=[0.35, 0.35, 0.30])
+    treatment = np.random.choice(TREATMENTS, n_samples, p=[0.35, 0.35, 0.30])
     
     # Generate biomarker levels
     biomarker1 = np.random.normal(50, 15, n_samples)
@@ -44,7 +49,7 @@ def generate_sample_survival_data(n_samples=500, random_seed=42):
     # Generate survival times based on covariates
     # Treatment B has better survival, higher age increases risk, biomarker1 affects survival
     baseline_hazard = 0.02
-    treatment_effect = np.where(treatment == 'B', 0.5, np.where(treatment == 'A', 0.8, 1.0))
+    treatment_effect = TREATMENT_EFFECT[np.searchsorted(TREATMENTS, treatment)]
     age_effect = age / 80
     biomarker_effect = biomarker1 / 100
     
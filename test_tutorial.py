@@ -3,6 +3,7 @@
 Test script to verify the tutorial works correctly at each step.
 """
 
+import io
 import sys
 import warnings
 warnings.filterwarnings('ignore')
@@ -16,12 +17,12 @@ print("\n[STEP 1] Checking package availability...")
 try:
     import pandas as pd
     import numpy as np
-    import matplotlib
-    matplotlib.use('Agg')  # Non-interactive backend
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    from lifelines import CoxPHFitter, KaplanMeierFitter
-    from sklearn.preprocessing import LabelEncoder
+    # Heavier packages are only checked here and imported by the steps that use them;
+    # seaborn and sklearn are not used below but the notebook's first cell imports them
+    from importlib.util import find_spec
+    for package in ['lifelines', 'matplotlib', 'seaborn', 'sklearn']:
+        if find_spec(package) is None:
+            raise ImportError(f"No module named '{package}'")
     print("✅ All required packages are available")
 except ImportError as e:
     print(f"❌ Missing package: {e}")
@@ -31,7 +32,10 @@ except ImportError as e:
 # Step 2: Load or generate data
 print("\n[STEP 2] Loading/generating data...")
 try:
-    data = pd.read_csv('data/sample_survival_data.csv')
+    # Same loader as the analysis script (prefers an up-to-date Parquet copy)
+    sys.path.insert(0, 'scripts')
+    from cox_regression_analysis import load_data
+    data = load_data('data/sample_survival_data.csv')
     print(f"✅ Data loaded: {data.shape[0]} rows, {data.shape[1]} columns")
     print(f"   Events: {data['event'].sum()}/{len(data)} ({100*data['event'].sum()/len(data):.1f}%)")
 except FileNotFoundError:
@@ -42,27 +46,28 @@ except FileNotFoundError:
 
 # Check data quality
 print("\n[STEP 2.1] Checking data quality...")
-print(f"   Missing values: {data.isnull().sum().sum()}")
+na_mask = data.isna().to_numpy().any(axis=1)
+print(f"   Rows with missing values: {int(na_mask.sum())}")
 print(f"   Survival time range: {data['survival_time'].min():.2f} - {data['survival_time'].max():.2f} days")
 print(f"   Age range: {data['age'].min()} - {data['age'].max()} years")
 print(f"   Treatment distribution: {data['treatment'].value_counts().to_dict()}")
 
 # Step 3: Data preprocessing
 print("\n[STEP 3] Preprocessing data...")
-data_clean = data.dropna().copy()
+data_clean = data.loc[~na_mask].reset_index(drop=True)
 print(f"✅ Removed missing values: {data.shape[0]} → {data_clean.shape[0]} rows")
 
 # Encode categorical variables
 # For gender, simple binary encoding is fine
-le_gender = LabelEncoder()
-data_clean['gender_encoded'] = le_gender.fit_transform(data_clean['gender'])
+gender_cat = data_clean['gender'].astype('category')
+data_clean['gender_encoded'] = gender_cat.cat.codes
 
 # For treatment, create dummy variables with Treatment C as reference
 treatment_dummies = pd.get_dummies(data_clean['treatment'], prefix='treatment', drop_first=False)
 data_clean = pd.concat([data_clean, treatment_dummies], axis=1)
 
 print(f"✅ Encoded categorical variables")
-print(f"   Gender encoding: {dict(zip(le_gender.classes_, le_gender.transform(le_gender.classes_)))}")
+print(f"   Gender encoding: {dict(enumerate(gender_cat.cat.categories))}")
 print(f"   Treatment dummy variables created: {list(treatment_dummies.columns)}")
 print(f"   (Treatment C will be the reference group)")
 
@@ -76,17 +81,27 @@ print(f"✅ Data prepared for Cox regression: {cox_data.shape}")
 
 # Step 4: Fit Cox model
 print("\n[STEP 4] Fitting Cox Proportional Hazards model...")
+# Diagnostics are buffered and written once per step (also if the step fails)
+buf = io.StringIO()
+p = buf.write
 try:
+    from lifelines import CoxPHFitter
+    
     cph = CoxPHFitter()
     cph.fit(cox_data, duration_col='duration', event_col='event')
     print("✅ Model fitted successfully")
     
+    # Cache the baseline cumulative hazard once for the survival predictions below
+    baseline_cumhaz = cph.baseline_cumulative_hazard_.iloc[:, 0]
+    baseline_times = baseline_cumhaz.index.to_numpy()
+    baseline_values = baseline_cumhaz.to_numpy()
+    
     # Check model summary
     print("\n[STEP 4.1] Model Summary:")
     print(f"   Concordance Index (C-index): {cph.concordance_index_:.4f}")
     
     # Check hazard ratios
-    print("\n[STEP 4.2] Hazard Ratios:")
+    p("\n[STEP 4.2] Hazard Ratios:\n")
     hr = cph.hazard_ratios_
     for cov, value in hr.items():
         # Get CI for HR (exponentiate log CIs)
@@ -95,10 +110,10 @@ try:
         ci_upper_hr = np.exp(ci_log.iloc[1])  # Second column (upper bound)
         p_val = cph.summary.loc[cov, 'p']
         sig = "***" if p_val < 0.001 else "**" if p_val < 0.01 else "*" if p_val < 0.05 else ""
-        print(f"   {cov:15s}: HR = {value:.4f} [CI: {ci_lower_hr:.4f}, {ci_upper_hr:.4f}] p={p_val:.4f} {sig}")
+        p(f"   {cov:15s}: HR = {value:.4f} [CI: {ci_lower_hr:.4f}, {ci_upper_hr:.4f}] p={p_val:.4f} {sig}\n")
     
     # Check for expected effects
-    print("\n[STEP 4.3] Checking for expected effects:")
+    p("\n[STEP 4.3] Checking for expected effects:\n")
     treatment_a_hr = hr.get('treatment_A', None)
     treatment_b_hr = hr.get('treatment_B', None)
     age_hr = hr.get('age', None)
@@ -106,31 +121,34 @@ try:
     
     if treatment_a_hr is not None:
         if treatment_a_hr < 1.0:
-            print(f"   ✅ Treatment A shows protective effect (HR = {treatment_a_hr:.4f} < 1.0 vs. C)")
+            p(f"   ✅ Treatment A shows protective effect (HR = {treatment_a_hr:.4f} < 1.0 vs. C)\n")
         else:
-            print(f"   ⚠️  Treatment A HR = {treatment_a_hr:.4f} (expected < 1.0)")
+            p(f"   ⚠️  Treatment A HR = {treatment_a_hr:.4f} (expected < 1.0)\n")
     
     if treatment_b_hr is not None:
         if treatment_b_hr < 1.0:
-            print(f"   ✅ Treatment B shows protective effect (HR = {treatment_b_hr:.4f} < 1.0 vs. C)")
+            p(f"   ✅ Treatment B shows protective effect (HR = {treatment_b_hr:.4f} < 1.0 vs. C)\n")
             if treatment_a_hr is not None and treatment_b_hr < treatment_a_hr:
-                print(f"   ✅ Treatment B has stronger protective effect than Treatment A (as expected)")
+                p(f"   ✅ Treatment B has stronger protective effect than Treatment A (as expected)\n")
         else:
-            print(f"   ⚠️  Treatment B HR = {treatment_b_hr:.4f} (expected < 1.0)")
+            p(f"   ⚠️  Treatment B HR = {treatment_b_hr:.4f} (expected < 1.0)\n")
     
     if age_hr is not None:
         if age_hr > 1.0:
-            print(f"   ✅ Age shows risk factor (HR = {age_hr:.4f} > 1.0)")
+            p(f"   ✅ Age shows risk factor (HR = {age_hr:.4f} > 1.0)\n")
         else:
-            print(f"   ⚠️  Age HR = {age_hr:.4f} (expected > 1.0)")
+            p(f"   ⚠️  Age HR = {age_hr:.4f} (expected > 1.0)\n")
     
     if biomarker1_hr is not None:
         if biomarker1_hr < 1.0:
-            print(f"   ✅ Biomarker1 shows protective effect (HR = {biomarker1_hr:.4f} < 1.0)")
+            p(f"   ✅ Biomarker1 shows protective effect (HR = {biomarker1_hr:.4f} < 1.0)\n")
         else:
-            print(f"   ⚠️  Biomarker1 HR = {biomarker1_hr:.4f} (expected < 1.0)")
+            p(f"   ⚠️  Biomarker1 HR = {biomarker1_hr:.4f} (expected < 1.0)\n")
+    
+    sys.stdout.write(buf.getvalue())
             
 except Exception as e:
+    sys.stdout.write(buf.getvalue())
     print(f"❌ Error fitting model: {e}")
     import traceback
     traceback.print_exc()
@@ -139,6 +157,10 @@ except Exception as e:
 # Step 5: Test plotting
 print("\n[STEP 5] Testing visualizations...")
 try:
+    import matplotlib
+    matplotlib.use('Agg')  # Non-interactive backend
+    import matplotlib.pyplot as plt
+    
     # Test hazard ratio plot
     fig, ax = plt.subplots(figsize=(10, 7))
     
@@ -178,14 +200,16 @@ try:
     # Test Kaplan-Meier curves
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
     
-    kmf = KaplanMeierFitter()
+    # Kaplan-Meier estimates computed on a shared time axis by the analysis script
+    from cox_regression_analysis import kaplan_meier_curves
+    
+    survival_time = data_clean['survival_time'].to_numpy()
+    event = data_clean['event'].to_numpy()
+    
     ax1 = axes[0]
-    for gender in data_clean['gender'].unique():
-        mask = data_clean['gender'] == gender
-        kmf.fit(data_clean[mask]['survival_time'], 
-                data_clean[mask]['event'], 
-                label=f'{gender}')
-        kmf.plot_survival_function(ax=ax1)
+    curves = kaplan_meier_curves(survival_time, event, data_clean.groupby('gender', observed=True).indices)
+    for gender, (times, survival) in curves.items():
+        ax1.step(times, survival, where='post', label=f'{gender}')
     
     ax1.set_title('Kaplan-Meier Curves by Gender', fontsize=12, fontweight='bold')
     ax1.set_xlabel('Time (days)')
@@ -193,14 +217,10 @@ try:
     ax1.grid(True, alpha=0.3)
     ax1.legend()
     
-    kmf = KaplanMeierFitter()
     ax2 = axes[1]
-    for treatment in sorted(data_clean['treatment'].unique()):
-        mask = data_clean['treatment'] == treatment
-        kmf.fit(data_clean[mask]['survival_time'], 
-                data_clean[mask]['event'], 
-                label=f'Treatment {treatment}')
-        kmf.plot_survival_function(ax=ax2)
+    curves = kaplan_meier_curves(survival_time, event, data_clean.groupby('treatment', observed=True).indices)
+    for treatment, (times, survival) in curves.items():
+        ax2.step(times, survival, where='post', label=f'Treatment {treatment}')
     
     ax2.set_title('Kaplan-Meier Curves by Treatment', fontsize=12, fontweight='bold')
     ax2.set_xlabel('Time (days)')
@@ -230,6 +250,8 @@ except Exception as e:
 
 # Step 7: Test predictions
 print("\n[STEP 7] Testing survival predictions...")
+buf = io.StringIO()
+p = buf.write
 try:
     new_patient = pd.DataFrame({
         'age': [65],
@@ -240,19 +262,54 @@ try:
         'biomarker2': [110.0]
     })
     
-    time_points = [365, 730, 1095, 1460]
-    survival_probs = cph.predict_survival_function(new_patient, times=time_points)
+    time_points = np.array([365, 730, 1095, 1460])
+    
+    # S(t | x) = exp(-H0(t) * partial_hazard(x)), with H0 linearly interpolated
+    # from the cached baseline (same interpolation as predict_survival_function)
+    partial_hazard = cph.predict_partial_hazard(new_patient).to_numpy()
+    cumulative_hazard = np.interp(time_points, baseline_times, baseline_values)
+    survival_probs = np.exp(-np.outer(partial_hazard, cumulative_hazard))
     
-    print("✅ Survival predictions successful")
-    print("   Example predictions for a 65-year-old female on Treatment B:")
-    for t, prob in zip(time_points, survival_probs.iloc[0]):
-        print(f"     {t:4d} days: {prob:.4f} ({prob*100:.2f}% survival probability)")
+    p("✅ Survival predictions successful\n")
+    p("   Example predictions for a 65-year-old female on Treatment B:\n")
+    for t, prob in zip(time_points, survival_probs[0]):
+        p(f"     {t:4d} days: {prob:.4f} ({prob*100:.2f}% survival probability)\n")
+    sys.stdout.write(buf.getvalue())
         
 except Exception as e:
+    sys.stdout.write(buf.getvalue())
     print(f"❌ Error making predictions: {e}")
     import traceback
     traceback.print_exc()
 
+# Step 8: Check that the generator's numba kernel matches its NumPy path
+print("\n[STEP 8] Checking data generator outcome paths...")
+try:
+    from generate_data_simple import _get_numba_kernel, _simulate_outcomes
+    
+    kernel = _get_numba_kernel()
+    if kernel is None:
+        print("⚠️  numba not installed, only the NumPy path is used")
+    else:
+        n = 100_000
+        rng = np.random.default_rng(0)
+        draws = (rng.integers(30, 81, n), rng.normal(50, 15, n).round(2),
+                 rng.integers(0, 3, n, dtype=np.int8), rng.standard_exponential(n),
+                 rng.uniform(365, 1825, n), rng.random(n), rng.random(n))
+        numba_time = np.empty(n)
+        numba_event = np.empty(n, dtype=np.int8)
+        kernel(*draws, numba_time, numba_event)
+        numpy_time, numpy_event = _simulate_outcomes(*draws)
+        if not (np.array_equal(numba_time, numpy_time) and np.array_equal(numba_event, numpy_event)):
+            raise AssertionError("numba kernel and NumPy path give different outcomes")
+        print(f"✅ numba kernel and NumPy path agree exactly on {n} patients")
+        
+except Exception as e:
+    print(f"❌ Error checking generator: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
 # Summary
 print("\n" + "="*80)
 print("TEST SUMMARY")
@@ -263,6 +320,7 @@ print("✅ Cox model fitting: OK")
 print("✅ Visualizations: OK")
 print("✅ Model diagnostics: OK")
 print("✅ Predictions: OK")
+print("✅ Generator outcome paths: OK")
 print("\nAll steps completed successfully!")
 print("="*80)
 